@@ -1,25 +1,25 @@
 # -*- coding: utf-8 -*-
+import time
+LAUNCH_TIME = time.perf_counter() # Antes das demais importações: o tempo até o primeiro byte inclui carregar FastAPI/Uvicorn
 import sys
 import os
 import threading
-import time
-import requests
 import uvicorn
-import yt_dlp
 import secrets
 import shutil
 import base64
 import asyncio
-from urllib.parse import urlparse, unquote_plus # Adiciona unquote_plus
+import math
+from urllib.parse import urlparse, unquote_plus, parse_qs # Adiciona unquote_plus
 from fastapi import FastAPI, Request, Response, Form, File, UploadFile, Depends, HTTPException, status
 from fastapi.responses import HTMLResponse, JSONResponse, RedirectResponse, StreamingResponse
 from fastapi.templating import Jinja2Templates
 from fastapi.staticfiles import StaticFiles
 from fastapi.security import HTTPBasic, HTTPBasicCredentials
-from werkzeug.utils import secure_filename
 import logging
 
 PORT_LIVE_TEMP = 8080
+FASTAPI_READY = asyncio.Event() # Sinalizado (no loop do roteador público) quando o Uvicorn interno já aceita conexões
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
@@ -33,7 +33,20 @@ app = FastAPI(title="Rádio Python PRO")
 os.makedirs('static', exist_ok=True)
 app.mount("/static", StaticFiles(directory="static"), name="static")
 templates = Jinja2Templates(directory="templates")
-radio = RadioStation()
+radio = RadioStation(launch_time=LAUNCH_TIME)
+
+class HLSStaticFiles(StaticFiles):
+    """Segmentos HLS são imutáveis (cache longo); só a playlist muda e não pode ficar em cache."""
+    def file_response(self, full_path, *args, **kwargs):
+        response = super().file_response(full_path, *args, **kwargs)
+        if str(full_path).endswith('.m3u8'):
+            response.headers['Cache-Control'] = 'no-cache'
+            response.headers['Content-Type'] = 'application/vnd.apple.mpegurl'
+        else:
+            response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+        return response
+
+app.mount("/hls", HLSStaticFiles(directory=radio.hls.directory), name="hls")
 
 # --- Autenticação NATIVA do FastAPI ---
 security = HTTPBasic()
@@ -63,17 +76,13 @@ def get_current_live_user(credentials: HTTPBasicCredentials = Depends(live_secur
         )
     return credentials.username
 
-# --- Filtro Jinja2 e Evento Startup ---
+# --- Filtro Jinja2 ---
+# As threads da rádio são iniciadas em main_loop, antes do Uvicorn, e não mais no evento startup do FastAPI
 def format_filename(filename: str):
     if not filename: return ""
     return os.path.splitext(filename)[0].replace('_', ' ')
 templates.env.filters['prettify'] = format_filename
 
-@app.on_event("startup")
-def startup_event():
-    logger.info(">>> Evento Startup do FastAPI: Iniciando threads da rádio... <<<")
-    radio.start()
-
 @app.get("/", response_class=HTMLResponse)
 async def index(request: Request):
     return templates.TemplateResponse("player.html", {"request": request, "radio_name": radio.radio_name})
@@ -97,7 +106,8 @@ async def public_status():
     return JSONResponse(content={
         "radio_name": status.get("radio_name"),
         "current_song_info_display": status.get("current_song_info_display"),
-        "current_cover_url": status.get("current_cover_url")
+        "current_cover_url": status.get("current_cover_url"),
+        "hls_url": "/hls/live.m3u8" if status.get("hls_enabled") else None
     })
 
 @app.get("/now_playing")
@@ -121,6 +131,7 @@ async def admin_status(user: str = Depends(get_current_user)):
 @app.post("/admin/upload")
 async def upload_file_route(type: str = Form(...), file: UploadFile = File(...), user: str = Depends(get_current_user)):
     if type in ['song', 'jingle', 'ad'] and file.filename.endswith('.mp3'):
+        from werkzeug.utils import secure_filename
         filename = secure_filename(file.filename)
         dir_map = {'song': MUSIC_DIR, 'jingle': JINGLES_DIR, 'ad': ADS_DIR}
         save_path = os.path.join(dir_map[type], filename)
@@ -154,6 +165,21 @@ async def update_live_settings(live_user: str = Form(...), live_password: str =
     radio.set_live_credentials(live_user, live_password)
     return RedirectResponse(url="/admin", status_code=303)
 
+@app.post("/admin/settings/handback")
+async def update_handback_settings(resume_after_live: bool = Form(False), user: str = Depends(get_current_user)):
+    radio.set_resume_after_live(resume_after_live)
+    return RedirectResponse(url="/admin", status_code=303)
+
+@app.post("/admin/settings/recording")
+async def update_recording_settings(recording_enabled: bool = Form(False), recording_retention_hours: int = Form(72), user: str = Depends(get_current_user)):
+    radio.set_recording(recording_enabled, recording_retention_hours)
+    return RedirectResponse(url="/admin", status_code=303)
+
+@app.post("/admin/settings/hls")
+async def update_hls_settings(hls_enabled: bool = Form(False), user: str = Depends(get_current_user)):
+    radio.set_hls_enabled(hls_enabled)
+    return RedirectResponse(url="/admin", status_code=303)
+
 @app.post("/admin/settings/admin_credentials")
 async def update_admin_credentials(admin_user: str = Form(...), admin_password: str = Form(None), user: str = Depends(get_current_user)):
     if admin_password == "": admin_password = None
@@ -178,6 +204,7 @@ async def reorder_files(request: Request, user: str = Depends(get_current_user))
 
 @app.post("/admin/search")
 async def search_youtube(query: str = Form(...), user: str = Depends(get_current_user)):
+    import yt_dlp # Importação pesada: só carrega quando a busca é usada
     ydl_opts = {
         'format': 'bestaudio/best',
         'noplaylist': True,
@@ -203,6 +230,7 @@ async def search_youtube(query: str = Form(...), user: str = Depends(get_current
 @app.post("/admin/download")
 async def download_youtube(video_id: str = Form(...), user: str = Depends(get_current_user)):
     def download_in_background(vid):
+        import yt_dlp
         ydl_opts = {
             'format': 'bestaudio/best',
             'outtmpl': os.path.join(MUSIC_DIR, '%(title)s.%(ext)s'),
@@ -228,6 +256,8 @@ async def download_youtube(video_id: str = Form(...), user: str = Depends(get_cu
 @app.post("/admin/download_from_url")
 async def download_from_url(type: str = Form(...), url: str = Form(...), user: str = Depends(get_current_user)):
     def download_task(target_url, f_type):
+        import requests
+        from werkzeug.utils import secure_filename
         try:
             filename = os.path.basename(urlparse(target_url).path) or f"download_{int(time.time())}.mp3"
             filename = secure_filename(filename)
@@ -282,9 +312,6 @@ async def handle_live_source(reader, writer):
         header_raw = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), timeout=10.0)
         headers = header_raw.decode('latin-1').split('\r\n')
         
-        ice_name_header = next((h for h in headers if h.lower().startswith('ice-name: ')), None)
-        if ice_name_header: radio.update_live_metadata(ice_name_header.split(':', 1)[1].strip())
-
         auth_header = next((h for h in headers if h.lower().startswith('authorization: basic ')), None)
         if not auth_header: raise Exception("Autenticação não fornecida")
         
@@ -297,7 +324,11 @@ async def handle_live_source(reader, writer):
         writer.write(b'HTTP/1.0 200 OK\r\nIcecast-Auth: 1\r\n\r\n')
         await writer.drain()
         radio.go_live()
-        
+
+        # Só depois de autenticado e no ar o nome enviado pelo DJ vira o título
+        ice_name_header = next((h for h in headers if h.lower().startswith('ice-name: ')), None)
+        if ice_name_header: radio.update_live_metadata(ice_name_header.split(':', 1)[1].strip())
+
         # O corpo que veio junto com os cabeçalhos já foi lido por readuntil,
         # então o reader está pronto para o stream de áudio.
         while True:
@@ -311,11 +342,49 @@ async def handle_live_source(reader, writer):
         if not writer.is_closing(): writer.close(); await writer.wait_closed()
         logger.info(f"[*] Conexão Ao Vivo de {addr} encerrada.")
 
-# 2. Proxy Transparente para o FastAPI
+# 2. Time-shift: serve os segmentos gravados direto do disco com sendfile (sem passar pelo FastAPI)
+async def handle_timeshift(writer, start_param: str):
+    addr = writer.get_extra_info('peername')
+    try:
+        # 'start' aceita um horário em epoch ou segundos negativos relativos a agora (ex.: start=-3600)
+        start = float(start_param)
+        start_ts = time.time() + start if start < 0 else start
+        if not math.isfinite(start_ts) or not 0 < start_ts <= time.time(): raise ValueError(start_param)
+    except ValueError:
+        writer.write(b'HTTP/1.0 400 Bad Request\r\nContent-Length: 0\r\n\r\n'); await writer.drain(); return
+    # Leitura do índice e abertura de arquivos vão para uma thread: o roteador público também carrega o /stream e o ao vivo
+    position = await asyncio.to_thread(radio.recorder.find_position, start_ts)
+    if not position:
+        writer.write(b'HTTP/1.0 404 Not Found\r\nContent-Length: 0\r\n\r\n'); await writer.drain(); return
+    logger.info(f"[{addr}] Time-shift a partir de {time.strftime('%d/%m %H:%M:%S', time.localtime(start_ts))}.")
+    writer.write(b'HTTP/1.0 200 OK\r\nContent-Type: audio/mpeg\r\nCache-Control: no-cache\r\n\r\n')
+    await writer.drain()
+    loop = asyncio.get_running_loop()
+    path, offset = position
+    while path:
+        next_path = None
+        try: f = await asyncio.to_thread(open, path, 'rb')
+        except FileNotFoundError: break # Removido pela retenção
+        with f:
+            while True:
+                size = os.fstat(f.fileno()).st_size
+                if size > offset:
+                    offset += await loop.sendfile(writer.transport, f, offset, size - offset)
+                    continue
+                # O segmento só está completo quando já existe o próximo (a gravação faz o flush antes de trocar)
+                next_path = radio.recorder.next_segment(path)
+                if next_path and os.fstat(f.fileno()).st_size == offset: break
+                if not next_path and not radio.recorder.is_active(path): break # Gravação parada: fim do time-shift
+                await asyncio.sleep(1)
+        path, offset = next_path, 0
+
+# 3. Proxy Transparente para o FastAPI
 async def proxy_to_fastapi(reader, writer, initial_data, internal_port: int):
     addr = writer.get_extra_info('peername')
     logger.info(f"[{addr}] Roteando para o servidor FastAPI interno.")
     try:
+        # O roteador público sobe antes do Uvicorn; as primeiras conexões esperam o sinal de pronto
+        if not FASTAPI_READY.is_set(): await asyncio.wait_for(FASTAPI_READY.wait(), timeout=30)
         # Conecta-se ao servidor Uvicorn que está rodando internamente
         fastapi_reader, fastapi_writer = await asyncio.open_connection('127.0.0.1', internal_port)
         
@@ -346,7 +415,7 @@ async def proxy_to_fastapi(reader, writer, initial_data, internal_port: int):
             writer.close()
             await writer.wait_closed()
 
-# 3. O Roteador Principal
+# 4. O Roteador Principal
 async def connection_handler(reader, writer, internal_port: int):
     initial_data = b''
     try:
@@ -356,6 +425,8 @@ async def connection_handler(reader, writer, internal_port: int):
         if not initial_data: return
 
         first_line = initial_data.split(b'\r\n', 1)[0].decode('latin-1', errors='ignore')
+        request_parts = first_line.split(' ')
+        query = parse_qs(urlparse(request_parts[1]).query) if len(request_parts) > 1 else {}
 
         if first_line.startswith('SOURCE /live') or first_line.startswith('PUT /live'):
             # Cria um novo "leitor" que começa com os dados que já pegamos
@@ -378,6 +449,8 @@ async def connection_handler(reader, writer, internal_port: int):
             asyncio.create_task(feed_new_reader())
             # Chama o handler do ao vivo com o NOVO leitor
             await handle_live_source(new_reader, writer)
+        elif first_line.startswith('GET /stream?') and 'start' in query:
+            await handle_timeshift(writer, query['start'][0])
         else:
             # É uma requisição web normal, passa para o proxy
             await proxy_to_fastapi(reader, writer, initial_data, internal_port)
@@ -390,20 +463,32 @@ async def connection_handler(reader, writer, internal_port: int):
             writer.close()
             await writer.wait_closed()
 
-# 4. Orquestrador de Inicialização
+# 5. Orquestrador de Inicialização
+class ReadyServer(uvicorn.Server):
+    """Servidor Uvicorn que sinaliza FASTAPI_READY assim que o socket interno está escutando."""
+    def __init__(self, config, public_loop):
+        super().__init__(config)
+        self.public_loop = public_loop # O Uvicorn roda em outra thread, com outro loop
+
+    async def startup(self, sockets=None):
+        await super().startup(sockets=sockets)
+        if not self.should_exit:
+            self.public_loop.call_soon_threadsafe(FASTAPI_READY.set)
+            logger.info(f"FastAPI interno pronto em {(time.perf_counter() - LAUNCH_TIME) * 1000:.0f} ms após o início.")
+
 async def main_loop(public_port):
     global PORT_LIVE_TEMP
     PORT_LIVE_TEMP = public_port
     internal_port = public_port + 1
+    # O AutoDJ começa a produzir áudio antes mesmo do servidor web subir
+    radio.start()
+
     # Inicia o servidor Uvicorn para o FastAPI em uma porta interna e em background
     config = uvicorn.Config(app, host="127.0.0.1", port=internal_port, log_level="info")
-    server = uvicorn.Server(config)
+    server = ReadyServer(config, asyncio.get_running_loop())
     uvicorn_thread = threading.Thread(target=server.run)
     uvicorn_thread.daemon = True
     uvicorn_thread.start()
-    
-    # Aguarda um segundo para o Uvicorn iniciar
-    await asyncio.sleep(1)
 
     # Inicia o nosso "guarda de trânsito" na porta pública
     public_server = await asyncio.start_server(
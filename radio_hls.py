@@ -0,0 +1,186 @@
+import os
+import time
+import struct
+import hashlib
+from threading import Thread, Lock
+from queue import Queue, Full, Empty
+
+# --- Constantes do HLS ---
+PLAYLIST_NAME = 'live.m3u8'
+SEGMENT_DURATION = 6 # Segundos por segmento
+PLAYLIST_SIZE = 6 # Segmentos anunciados na playlist
+SEGMENTS_KEPT = PLAYLIST_SIZE + 4 # Segmentos mantidos no disco (margem para clientes atrasados)
+MAX_UNSYNCED_BYTES = 64 * 1024 # Lixo sem cabeçalho MP3 válido que pode ficar acumulado antes de ser descartado
+
+# --- Tabelas do cabeçalho de quadro MPEG áudio ---
+_BITRATES = { # (versão MPEG 1 ou 2/2.5, camada) -> kbps por índice
+    (1, 1): [0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448],
+    (1, 2): [0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384],
+    (1, 3): [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    (2, 1): [0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256],
+    (2, 2): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+    (2, 3): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+_SAMPLE_RATES = {3: [44100, 48000, 32000], 2: [22050, 24000, 16000], 0: [11025, 12000, 8000]} # Bits de versão -> Hz
+
+def default_hls_dir():
+    """Em tmpfs (/dev/shm) os segmentos ficam na memória, mas ainda podem ser servidos como arquivos estáticos (ex.: nginx).
+
+    O nome depende da pasta de trabalho, para duas rádios na mesma máquina não apagarem os arquivos uma da outra.
+    """
+    if not os.path.isdir('/dev/shm'): return 'hls'
+    instance = hashlib.sha1(os.path.abspath('.').encode('utf-8')).hexdigest()[:10]
+    return os.path.join('/dev/shm', f"radio_hls_{instance}")
+
+# --- Funções Auxiliares para ler os quadros MP3 ---
+def parse_frame_header(data, pos):
+    """Lê o cabeçalho de quadro em 'pos'. Retorna (tamanho em bytes, duração em segundos) ou None se não for válido."""
+    if pos + 4 > len(data) or data[pos] != 0xff or data[pos + 1] & 0xe0 != 0xe0: return None
+    version_bits, layer_bits = (data[pos + 1] >> 3) & 0x03, (data[pos + 1] >> 1) & 0x03
+    bitrate_index, rate_index, padding = data[pos + 2] >> 4, (data[pos + 2] >> 2) & 0x03, (data[pos + 2] >> 1) & 0x01
+    if version_bits == 1 or layer_bits == 0 or bitrate_index in (0, 15) or rate_index == 3: return None
+    version, layer = (1 if version_bits == 3 else 2), 4 - layer_bits
+    bitrate, sample_rate = _BITRATES[(version, layer)][bitrate_index] * 1000, _SAMPLE_RATES[version_bits][rate_index]
+    if layer == 1: return (12 * bitrate // sample_rate + padding) * 4, 384 / sample_rate
+    samples = 576 if layer == 3 and version == 2 else 1152
+    return samples // 8 * bitrate // sample_rate + padding, samples / sample_rate
+
+def find_frame_sync(data, start):
+    """Posição do próximo quadro MP3 confirmado (o quadro seguinte começa onde o tamanho dele indica), ou -1."""
+    pos = data.find(b'\xff', start)
+    while pos != -1:
+        header = parse_frame_header(data, pos)
+        if header and parse_frame_header(data, pos + header[0]): return pos
+        pos = data.find(b'\xff', pos + 1)
+    return -1
+
+# --- Funções Auxiliares para montar a tag ID3 de cada segmento ---
+def _syncsafe(size):
+    return bytes([(size >> 21) & 0x7f, (size >> 14) & 0x7f, (size >> 7) & 0x7f, size & 0x7f])
+
+def _id3_frame(frame_id, payload):
+    return frame_id.encode('latin-1') + _syncsafe(len(payload)) + b'\x00\x00' + payload
+
+def build_id3_tag(timestamp_90khz, title=None, cover_url=None):
+    """Tag ID3v2.4 exigida no início de segmentos de áudio 'packed' do HLS, com o título e a capa como metadados temporizados."""
+    frames = _id3_frame('PRIV', b'com.apple.streaming.transportStreamTimestamp\x00' + struct.pack('>Q', timestamp_90khz & 0x1ffffffff))
+    if title: frames += _id3_frame('TIT2', b'\x03' + title.encode('utf-8'))
+    if cover_url: frames += _id3_frame('WXXX', b'\x03cover\x00' + cover_url.encode('latin-1', errors='ignore'))
+    return b'ID3\x04\x00\x00' + _syncsafe(len(frames)) + frames
+
+class HLSSegmenter:
+    """Corta o sinal da transmissão em segmentos MP3 curtos e mantém uma playlist HLS rotativa.
+
+    Os segmentos nunca mudam depois de escritos (nome único por número de sequência), então podem ser servidos
+    como imutáveis e absorvidos por um cache/CDN; só a playlist precisa ser buscada de novo pelos clientes.
+    A duração de cada segmento vem dos quadros MP3 (amostras / taxa), não do tamanho em bytes.
+    """
+    def __init__(self, directory=None, enabled=False):
+        self.directory = directory or default_hls_dir()
+        self.enabled = enabled
+        self.queue = Queue(maxsize=512)
+        self.lock = Lock()
+        self.title, self.cover_url = None, None
+        self.sequence = int(time.time()) # Cresce entre reinícios, então nomes de segmentos não se repetem
+        self.segments = [] # (sequência, nome, duração, epoch de início, título, tem descontinuidade, seq. de descontinuidade)
+        self.elapsed = 0.0 # Segundos de áudio já segmentados (base do timestamp PRIV)
+        self.discontinuity_sequence = 0
+        os.makedirs(self.directory, exist_ok=True)
+        for name in os.listdir(self.directory): # Playlist e segmentos de uma execução anterior já não valem mais
+            if name.startswith('seg_') or name == PLAYLIST_NAME: os.remove(os.path.join(self.directory, name))
+
+    def start(self):
+        segmenter = Thread(target=self._segmenter_thread, daemon=True); segmenter.start()
+
+    def set_enabled(self, enabled):
+        was_enabled, self.enabled = self.enabled, bool(enabled)
+        if was_enabled and not self.enabled: self._enqueue(('clear', None))
+
+    def feed(self, chunk):
+        """Chamado pelo broadcaster. Nunca bloqueia: se o segmentador atrasar, o bloco é descartado."""
+        if self.enabled: self._enqueue(('audio', chunk))
+
+    def discontinuity(self):
+        """Troca de fonte (ao vivo <-> AutoDJ): fecha o segmento atual e marca o próximo com #EXT-X-DISCONTINUITY."""
+        if self.enabled: self._enqueue(('discontinuity', None))
+
+    def set_metadata(self, title, cover_url):
+        with self.lock: self.title, self.cover_url = title, cover_url
+
+    def _enqueue(self, item):
+        try: self.queue.put_nowait(item)
+        except Full: pass
+
+    def _segmenter_thread(self):
+        buffer, pos, duration, started_at = bytearray(), 0, 0.0, time.time()
+        pending_discontinuity = False # O primeiro segmento desta execução não tem nada antes dele
+        while True:
+            try: kind, chunk = self.queue.get(timeout=1)
+            except Empty: continue
+            if kind == 'clear':
+                buffer.clear(); pos, duration = 0, 0.0; self._clear()
+                pending_discontinuity = True # Ao religar, o tempo do áudio pulou
+                continue
+            if kind == 'discontinuity':
+                if duration > 0: self._emit(buffer, pos, duration, started_at, pending_discontinuity); del buffer[:pos]
+                pos, duration, started_at = 0, 0.0, time.time()
+                pending_discontinuity = True
+                continue
+            if not buffer: started_at = time.time()
+            buffer += chunk
+            while True:
+                header = parse_frame_header(buffer, pos)
+                if header and pos + header[0] + 4 > len(buffer): break # Precisa do próximo cabeçalho para confirmar o quadro
+                if header and parse_frame_header(buffer, pos + header[0]):
+                    pos += header[0]; duration += header[1]
+                    if duration >= SEGMENT_DURATION:
+                        self._emit(buffer, pos, duration, started_at, pending_discontinuity)
+                        del buffer[:pos]; pos, duration, started_at, pending_discontinuity = 0, 0.0, time.time(), False
+                    continue
+                # Perdeu o sincronismo (troca de fonte, dados corrompidos): pula até o próximo quadro confirmado
+                sync = find_frame_sync(buffer, pos + 1)
+                if sync != -1: pos = sync; continue
+                if len(buffer) - pos > MAX_UNSYNCED_BYTES: del buffer[pos:]
+                break
+
+    def _emit(self, buffer, pos, duration, started_at, discontinuity):
+        try: self._write_segment(bytes(buffer[:pos]), duration, started_at, discontinuity)
+        except OSError as e: print(f"Erro ao gravar segmento HLS: {e}")
+
+    def _write_segment(self, data, duration, started_at, discontinuity):
+        with self.lock: title, cover_url = self.title, self.cover_url
+        timestamp = int(self.elapsed * 90000)
+        self.elapsed += duration
+        self.sequence += 1
+        if discontinuity: self.discontinuity_sequence += 1
+        name = f"seg_{self.sequence}.mp3"
+        self._atomic_write(name, build_id3_tag(timestamp, title, cover_url) + data)
+        self.segments.append((self.sequence, name, duration, started_at, title, discontinuity, self.discontinuity_sequence))
+        for old in self.segments[:-SEGMENTS_KEPT]:
+            try: os.remove(os.path.join(self.directory, old[1]))
+            except FileNotFoundError: pass
+        self.segments = self.segments[-SEGMENTS_KEPT:]
+        self._atomic_write(PLAYLIST_NAME, self.build_playlist().encode('utf-8'))
+
+    def build_playlist(self):
+        listed = self.segments[-PLAYLIST_SIZE:]
+        target = max([SEGMENT_DURATION] + [int(s[2] + 0.999) for s in listed])
+        lines = ['#EXTM3U', '#EXT-X-VERSION:3', f'#EXT-X-TARGETDURATION:{target}',
+                 f'#EXT-X-MEDIA-SEQUENCE:{listed[0][0] if listed else 0}', f'#EXT-X-DISCONTINUITY-SEQUENCE:{listed[0][6] if listed else 0}']
+        for i, (_, name, duration, started_at, title, discontinuity, _) in enumerate(listed):
+            if discontinuity and i > 0: lines.append('#EXT-X-DISCONTINUITY')
+            lines.append('#EXT-X-PROGRAM-DATE-TIME:' + time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(started_at)) + f".{int(started_at % 1 * 1000):03d}Z")
+            lines.append(f'#EXTINF:{duration:.3f},{(title or "").replace(",", " ")}')
+            lines.append(name)
+        return '\n'.join(lines) + '\n'
+
+    def _atomic_write(self, name, data):
+        path = os.path.join(self.directory, name)
+        with open(f"{path}.tmp", 'wb') as f: f.write(data)
+        os.replace(f"{path}.tmp", path)
+
+    def _clear(self):
+        for name in [s[1] for s in self.segments] + [PLAYLIST_NAME]:
+            try: os.remove(os.path.join(self.directory, name))
+            except FileNotFoundError: pass
+        self.segments = []
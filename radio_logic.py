@@ -3,10 +3,10 @@ import random
 import time
 import json
 import subprocess
-import imageio_ffmpeg as ffmpeg
-from threading import Thread, RLock
+from threading import Thread, RLock, Event
 from queue import Queue, Full, Empty
-from mutagen.id3 import ID3, APIC
+from radio_recorder import StreamRecorder
+from radio_hls import HLSSegmenter
 
 # --- Constantes de Diretório ---
 MUSIC_DIR = 'music'
@@ -16,7 +16,34 @@ CONFIG_DIR = 'config'
 STATIC_DIR = 'static'
 COVER_DIR = os.path.join(STATIC_DIR, 'cover')
 
-SILENT_CHUNK = b'\xff\xfb\x90\x44' + b'\x00' * (4096 - 4)
+STATE_FILE = os.path.join(CONFIG_DIR, 'state.json')
+LIBRARY_FILE = os.path.join(CONFIG_DIR, 'library.json')
+
+SILENT_FRAME = b'\xff\xfb\x90\x44' + b'\x00' * 413 # Quadro MP3 completo (128k, 44.1kHz) de silêncio
+SILENT_CHUNK = SILENT_FRAME * 10 # Quadros inteiros, para quem analisa o stream (ex.: HLS) não perder o sincronismo
+BYTES_PER_SECOND = 128000 // 8 # Saída do FFmpeg é MP3 CBR 128k
+STATE_CHECKPOINT_INTERVAL = 2 # Segundos entre snapshots do estado de reprodução
+PACING_LEAD = 0.5 # Segundos de áudio que o AutoDJ pode adiantar na fila
+
+_ffmpeg_exe = None
+
+# --- Função Auxiliar para localizar o FFmpeg (uma única vez por processo) ---
+def get_ffmpeg_exe():
+    global _ffmpeg_exe
+    if _ffmpeg_exe is None:
+        import imageio_ffmpeg
+        _ffmpeg_exe = imageio_ffmpeg.get_ffmpeg_exe()
+    return _ffmpeg_exe
+
+# --- Função Auxiliar para gravar JSON sem corromper o arquivo em caso de queda ---
+def atomic_write_json(path, data, indent=None):
+    """Grava em um arquivo temporário e o renomeia por cima do original (os.replace é atômico)."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=indent)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
 
 # --- Função Auxiliar para drenar logs do FFmpeg ---
 def drain_pipe(pipe):
@@ -33,8 +60,11 @@ def drain_pipe(pipe):
         pass
 
 class RadioStation:
-    def __init__(self):
+    def __init__(self, launch_time=None):
         self.lock = RLock()
+        self.launch_time = launch_time if launch_time is not None else time.perf_counter()
+        self.first_audio_ms = None # Tempo do início até o primeiro byte de áudio real transmitido
+        self.started = False
         
         for d in [MUSIC_DIR, JINGLES_DIR, ADS_DIR, CONFIG_DIR, STATIC_DIR, COVER_DIR]:
             os.makedirs(d, exist_ok=True)
@@ -46,7 +76,11 @@ class RadioStation:
         self.settings_file = os.path.join(CONFIG_DIR, 'settings.json')
         self.load_settings()
 
+        self.recorder = StreamRecorder(retention_hours=self.recording_retention_hours, enabled=self.recording_enabled)
+        self.hls = HLSSegmenter(enabled=self.hls_enabled)
+
         self.live_source_active = False
+        self.autodj_wakeup = Event() # Acorda o AutoDJ na hora em que o ao vivo termina ou a transmissão é iniciada
         self.autodj_queue = Queue(maxsize=128)
         self.live_queue = Queue(maxsize=128)
         
@@ -64,8 +98,21 @@ class RadioStation:
         self.listeners = []
         self.current_item = None
         self.current_song_info = "Rádio iniciando..."
-        
-        self.reload_master_lists()
+
+        # --- Estado de reprodução persistido (retomada rápida após reinício) ---
+        self.state_lock = RLock()
+        self.state_pending = Event() # Acorda a thread que grava os snapshots
+        self.pending_state, self.pending_library = None, None # Só o snapshot mais recente de cada um é gravado
+        state_writer = Thread(target=self._state_writer_thread, daemon=True); state_writer.start()
+        self.current_offset_bytes = 0
+        self.resume_item = None
+        self._last_checkpoint = 0.0
+        # Listas mestras e fila só são gravadas quando mudam; o snapshot periódico guarda só quantos itens da fila já saíram
+        self.library_generation = 0
+        self.library_dirty = False
+        self.queue_consumed = 0
+        self.state_restored = self._restore_state()
+        if not self.state_restored: self.reload_master_lists()
 
     def load_settings(self):
         """MODIFICADO: Carrega todas as configurações, incluindo todas as credenciais."""
@@ -77,10 +124,17 @@ class RadioStation:
                 self.live_password = settings.get('live_password', '12345')
                 self.admin_user = settings.get('admin_user', 'admin')
                 self.admin_password = settings.get('admin_password', '12345')
+                self.resume_after_live = settings.get('resume_after_live', True)
+                self.recording_enabled = settings.get('recording_enabled', False)
+                self.recording_retention_hours = settings.get('recording_retention_hours', 72)
+                self.hls_enabled = settings.get('hls_enabled', False)
         except (FileNotFoundError, json.JSONDecodeError):
             print(f"Arquivo '{self.settings_file}' não encontrado. Criando um novo com valores padrão.")
             self.radio_name, self.live_user, self.live_password = 'Rádio Python', 'dj_live', '12345'
             self.admin_user, self.admin_password = 'admin', '12345'
+            self.resume_after_live = True
+            self.recording_enabled, self.recording_retention_hours = False, 72
+            self.hls_enabled = False
             self.save_settings()
 
     def save_settings(self):
@@ -91,10 +145,13 @@ class RadioStation:
                 'live_user': self.live_user,
                 'live_password': self.live_password,
                 'admin_user': self.admin_user,
-                'admin_password': self.admin_password
+                'admin_password': self.admin_password,
+                'resume_after_live': self.resume_after_live,
+                'recording_enabled': self.recording_enabled,
+                'recording_retention_hours': self.recording_retention_hours,
+                'hls_enabled': self.hls_enabled
             }
-            with open(self.settings_file, 'w', encoding='utf-8') as f:
-                json.dump(settings, f, indent=4)
+            atomic_write_json(self.settings_file, settings, indent=4)
             print("Configurações salvas.")
 
     def set_live_credentials(self, username, password):
@@ -111,8 +168,110 @@ class RadioStation:
             if password: self.admin_password = password # Só atualiza se uma nova senha for fornecida
             self.save_settings()
 
+    def set_resume_after_live(self, enabled):
+        """Define se, ao fim do ao vivo, o AutoDJ retoma a faixa interrompida ou passa para a próxima."""
+        with self.lock:
+            self.resume_after_live = bool(enabled)
+            self.save_settings()
+
+    def set_recording(self, enabled, retention_hours):
+        """Liga/desliga a gravação do stream e define por quantas horas os segmentos ficam no disco."""
+        with self.lock:
+            self.recording_enabled = bool(enabled); self.recording_retention_hours = max(0, int(retention_hours))
+            self.recorder.retention_hours = self.recording_retention_hours
+            self.recorder.set_enabled(self.recording_enabled)
+            if self.recording_enabled: self.recorder.mark(self.live_song_info if self.live_source_active else self.current_song_info)
+            self.save_settings()
+
+    def set_hls_enabled(self, enabled):
+        """Liga/desliga a saída HLS (segmentos + playlist em HLS_DIR)."""
+        with self.lock:
+            self.hls_enabled = bool(enabled)
+            self.hls.set_enabled(self.hls_enabled)
+            self.save_settings()
+
+    def _restore_state(self):
+        """Recupera o snapshot de reprodução. As listas mestras salvas evitam varrer a biblioteca na partida."""
+        try:
+            with open(LIBRARY_FILE, 'r', encoding='utf-8') as f: library = json.load(f)
+            with open(STATE_FILE, 'r', encoding='utf-8') as f: state = json.load(f)
+            lists = library['master_lists']
+            songs, jingles, ads = list(lists['songs']), list(lists['jingles']), list(lists['ads'])
+            play_queue = list(library['play_queue'])
+            generation = int(library['generation'])
+            # A fila salva só vale se o snapshot leve foi feito sobre a mesma versão dela
+            queue_consumed = int(state.get('queue_consumed', 0)) if state.get('library_generation') == generation else 0
+            del play_queue[:queue_consumed]
+            counters = {key: int(state.get(key, default)) for key, default in [('jingle_interval', self.jingle_interval), ('ad_interval', self.ad_interval), ('songs_since_jingle', 0), ('songs_since_ad', 0), ('last_jingle_index', -1), ('last_ad_index', -1)]}
+            playback_mode = state.get('playback_mode', self.playback_mode)
+            if playback_mode not in ['shuffle', 'sequential']: raise ValueError(f"modo inválido: {playback_mode}")
+            current = state.get('current_item')
+            resume_item = {'type': current['type'], 'filename': current['filename'], 'offset_bytes': int(state.get('offset_bytes', 0))} if current else None
+            if resume_item and resume_item['type'] not in ['song', 'jingle', 'ad']: raise ValueError(f"tipo inválido: {resume_item['type']}")
+        except FileNotFoundError:
+            return False
+        except (ValueError, KeyError, TypeError, AttributeError) as e: # JSONDecodeError é um ValueError
+            print(f"Snapshot de reprodução inválido, ignorando: {e}")
+            return False
+        with self.lock:
+            self.master_song_list, self.master_jingle_list, self.master_ad_list, self.play_queue = songs, jingles, ads, play_queue
+            # LIBRARY_FILE continua com a fila inteira: o contador segue dela, senão um segundo reinício repetiria músicas
+            self.library_generation, self.queue_consumed = generation, queue_consumed
+            self.playback_mode = playback_mode
+            for key, value in counters.items(): setattr(self, key, value)
+            self.resume_item = resume_item
+        print(f"Estado de reprodução restaurado de '{STATE_FILE}'.")
+        return True
+
+    def checkpoint_state(self, force=False):
+        """Salva o snapshot leve (item atual, offset e contadores). Sem 'force', grava no máximo a cada STATE_CHECKPOINT_INTERVAL segundos.
+
+        As listas mestras e a fila vão para LIBRARY_FILE só quando mudaram. A gravação (com fsync) fica com
+        _state_writer_thread, então um disco lento nunca atrasa o AutoDJ nem o broadcaster.
+        """
+        now = time.monotonic()
+        if not force and now - self._last_checkpoint < STATE_CHECKPOINT_INTERVAL: return
+        library = None
+        with self.lock:
+            self._last_checkpoint = now
+            if self.library_dirty:
+                self.library_generation += 1; self.library_dirty = False; self.queue_consumed = 0
+                library = {
+                    'generation': self.library_generation,
+                    'master_lists': {'songs': list(self.master_song_list), 'jingles': list(self.master_jingle_list), 'ads': list(self.master_ad_list)},
+                    'play_queue': list(self.play_queue)
+                }
+            state = {
+                'saved_at': time.time(),
+                'library_generation': self.library_generation,
+                'queue_consumed': self.queue_consumed,
+                'playback_mode': self.playback_mode,
+                'jingle_interval': self.jingle_interval,
+                'ad_interval': self.ad_interval,
+                'songs_since_jingle': self.songs_since_jingle,
+                'songs_since_ad': self.songs_since_ad,
+                'last_jingle_index': self.last_jingle_index,
+                'last_ad_index': self.last_ad_index,
+                'current_item': self.current_item,
+                'offset_bytes': self.current_offset_bytes
+            }
+        with self.state_lock:
+            self.pending_state = state
+            if library: self.pending_library = library
+        self.state_pending.set()
+
+    def _state_writer_thread(self):
+        while True:
+            self.state_pending.wait(); self.state_pending.clear()
+            with self.state_lock: state, library, self.pending_state, self.pending_library = self.pending_state, self.pending_library, None, None
+            try:
+                if library: atomic_write_json(LIBRARY_FILE, library)
+                if state: atomic_write_json(STATE_FILE, state)
+            except OSError as e: print(f"Erro ao salvar o estado de reprodução: {e}")
+
     def _extract_and_save_cover(self, file_path):
         try:
+            from mutagen.id3 import ID3 # Importação adiada: só é necessária quando uma faixa começa
             audio = ID3(file_path)
             apic = audio.getall('APIC:')
             if apic:
@@ -132,6 +291,9 @@ class RadioStation:
                 self.live_source_active = True
                 self.live_song_info = "AO VIVO - Aguardando metadados..."
                 self.current_cover_url = "/static/cover/default.png"
+                self.recorder.mark(self.live_song_info, new_segment='live')
+                self.hls.set_metadata(self.live_song_info, self.current_cover_url)
+                self.hls.discontinuity()
                 while not self.live_queue.empty():
                     try: self.live_queue.get_nowait()
                     except Empty: break
@@ -142,40 +304,108 @@ class RadioStation:
                 print(">>> MUDANÇA DE SINAL: SAINDO DO AR. RETOMANDO AUTO DJ. <<<")
                 self.live_source_active = False
                 self.current_cover_url = "/static/cover/default.png"
+                self.recorder.mark(self.current_song_info, new_segment='')
+                self.hls.set_metadata(self.current_song_info, self.current_cover_url)
+                self.hls.discontinuity()
+                self.autodj_wakeup.set()
 
     def update_live_metadata(self, song_name):
         with self.lock:
             pretty_name = song_name.replace('+', ' ').strip()
             self.live_song_info = pretty_name
+            if self.live_source_active: # Fora do ao vivo o título não está no ar
+                self.recorder.mark(pretty_name)
+                self.hls.set_metadata(pretty_name, self.current_cover_url)
             print(f"[METADATOS AO VIVO ATUALIZADOS] {pretty_name}")
 
+    def _take_resume_item(self):
+        with self.lock:
+            item, self.resume_item = self.resume_item, None
+            return item
+
+    def _open_source(self, item_type, filename, offset_bytes=0):
+        """Inicia o FFmpeg para o item e já lê o primeiro bloco, deixando a fonte 'aquecida' para entrar sem atraso."""
+        dir_map = {'song': MUSIC_DIR, 'jingle': JINGLES_DIR, 'ad': ADS_DIR}; item_path = os.path.join(dir_map[item_type], filename)
+        if not os.path.exists(item_path): print(f"!!! AVISO: Arquivo não encontrado: {item_path}. Pulando."); return None
+        seek_args = ['-ss', f"{offset_bytes / BYTES_PER_SECOND:.3f}"] if offset_bytes else [] # Busca pelo índice antes do '-i', sem decodificar desde o início
+        # Sem '-re': o ritmo é controlado por _pump_source, então o FFmpeg pode ficar bloqueado no pipe enquanto a fonte espera
+        ffmpeg_command = [get_ffmpeg_exe(), *seek_args, '-i', item_path, '-vn', '-ar', '44100', '-ac', '2', '-b:a', '128k', '-f', 'mp3', 'pipe:1']
+        proc = subprocess.Popen(ffmpeg_command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        stderr_thread = Thread(target=drain_pipe, args=(proc.stderr,)); stderr_thread.daemon = True; stderr_thread.start()
+        return {'type': item_type, 'filename': filename, 'path': item_path, 'proc': proc, 'stderr_thread': stderr_thread, 'offset_bytes': offset_bytes, 'pending': [proc.stdout.read(4096)]}
+
+    def _prepare_next_source(self):
+        """Abre a próxima fonte (faixa a retomar ou próximo item da fila). Retorna None se não houver nada para tocar."""
+        while True:
+            offset_bytes = 0
+            resume = self._take_resume_item()
+            if resume: item_type, filename, offset_bytes = resume['type'], resume['filename'], resume['offset_bytes']
+            else: item_type, filename = self._get_next_item()
+            if not item_type: return None
+            try: source = self._open_source(item_type, filename, offset_bytes)
+            except Exception as e: print(f"Erro ao iniciar o FFmpeg para {filename}: {e}"); source = None; time.sleep(1)
+            if source: return source
+            self.reload_master_lists()
+
+    def _close_source(self, source):
+        proc = source['proc']
+        if proc.poll() is None: proc.terminate()
+        return_code = proc.wait(); source['stderr_thread'].join()
+        if return_code not in [0, -9, -15]: print(f"!!! AVISO: FFmpeg encerrou com código {return_code} para: {source['filename']}.")
+
+    def _set_current_source(self, source, announce=True):
+        with self.lock:
+            item_type, filename = source['type'], source['filename']
+            self.current_item = {'type': item_type, 'filename': filename}; self.current_offset_bytes = source['offset_bytes']
+            if announce:
+                self.current_song_info = f"({item_type.upper()}) {filename}" if item_type != 'song' else filename
+                if not self.live_source_active: # Se o ao vivo entrou no meio da preparação, a faixa é anunciada na devolução
+                    if not self._extract_and_save_cover(source['path']): self.current_cover_url = "/static/cover/default.png"
+                    self.recorder.mark(self.current_song_info)
+                    self.hls.set_metadata(self.current_song_info, self.current_cover_url)
+        self.checkpoint_state(force=True)
+
+    def _pump_source(self, source):
+        """Envia a fonte para a fila do AutoDJ em tempo real. Retorna True se a faixa terminou, False se foi interrompida."""
+        started, sent = time.monotonic(), 0
+        while self.is_playing and not self.live_source_active:
+            chunk = source['pending'].pop(0) if source['pending'] else source['proc'].stdout.read(4096)
+            if not chunk: return True
+            ahead = sent / BYTES_PER_SECOND - (time.monotonic() - started)
+            if ahead > PACING_LEAD: time.sleep(ahead - PACING_LEAD)
+            self.autodj_queue.put(chunk); sent += len(chunk)
+            source['offset_bytes'] += len(chunk); self.current_offset_bytes = source['offset_bytes']; self.checkpoint_state()
+        return False
+
     def _auto_dj_thread(self):
-        # ... (Este método permanece exatamente o mesmo da sua versão) ...
+        source = None # Fonte aquecida: faixa interrompida pelo ao vivo ou próxima pré-carregada
         while True:
-            while not self.is_playing or self.live_source_active: time.sleep(1)
-            item_type, filename = self._get_next_item()
-            if not item_type: self.autodj_queue.put(SILENT_CHUNK); time.sleep(5); continue
-            with self.lock: self.current_item = {'type': item_type, 'filename': filename}; self.current_song_info = f"({item_type.upper()}) {filename}" if item_type != 'song' else filename
-            dir_map = {'song': MUSIC_DIR, 'jingle': JINGLES_DIR, 'ad': ADS_DIR}; item_path = os.path.join(dir_map[item_type], filename)
-            if not os.path.exists(item_path): print(f"!!! AVISO: Arquivo não encontrado: {item_path}. Pulando."); self.reload_master_lists(); continue
-            with self.lock:
-                if not self._extract_and_save_cover(item_path): self.current_cover_url = "/static/cover/default.png"
-            print(f"--- [AutoDJ] Preparando: {self.current_song_info} ---")
-            proc = None
-            try:
-                ffmpeg_exe = ffmpeg.get_ffmpeg_exe(); ffmpeg_command = [ffmpeg_exe, '-re', '-i', item_path, '-vn', '-ar', '44100', '-ac', '2', '-b:a', '128k', '-f', 'mp3', 'pipe:1']
-                proc = subprocess.Popen(ffmpeg_command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-                stderr_thread = Thread(target=drain_pipe, args=(proc.stderr,)); stderr_thread.daemon = True; stderr_thread.start()
-                while self.is_playing and not self.live_source_active:
-                    chunk = proc.stdout.read(4096)
-                    if not chunk: break
-                    self.autodj_queue.put(chunk)
-                if proc.poll() is None: proc.terminate()
-                return_code = proc.wait(); stderr_thread.join()
-                if return_code not in [0, -9, -15]: print(f"!!! AVISO: FFmpeg encerrou com código {return_code} para: {filename}.")
-            except Exception as e: print(f"Erro no _auto_dj_thread: {e}");
-            if proc and proc.poll() is None: proc.terminate()
-            with self.lock: self.current_item = None
+            if not self.is_playing:
+                if source: self._close_source(source); source = None
+                self.autodj_wakeup.wait(1); self.autodj_wakeup.clear(); continue
+            if self.live_source_active:
+                # Durante o ao vivo mantém a próxima fonte pronta, para a devolução ao AutoDJ não ter silêncio
+                if source and source.get('interrupted') and not self.resume_after_live:
+                    self._close_source(source); source = None
+                    # Descarta o que a faixa interrompida já tinha enfileirado, para a devolução começar limpa no próximo item
+                    while not self.autodj_queue.empty():
+                        try: self.autodj_queue.get_nowait()
+                        except Empty: break
+                if source is None:
+                    source = self._prepare_next_source()
+                    if source: self._set_current_source(source, announce=False); print(f"--- [AutoDJ] Pré-carregado durante o ao vivo: {source['filename']} ---")
+                self.autodj_wakeup.wait(1); self.autodj_wakeup.clear(); continue
+            if source is None: source = self._prepare_next_source()
+            if source is None: self.autodj_queue.put(SILENT_CHUNK); time.sleep(5); continue
+            self._set_current_source(source)
+            offset_bytes = source['offset_bytes']
+            print(f"--- [AutoDJ] Tocando: {self.current_song_info} ---" + (f" (retomando em {offset_bytes / BYTES_PER_SECOND:.1f}s)" if offset_bytes else ""))
+            try: finished = self._pump_source(source)
+            except Exception as e: print(f"Erro no _auto_dj_thread: {e}"); finished = True
+            if not finished and self.is_playing: source['interrupted'] = True; continue # Mantém o FFmpeg parado no pipe até o fim do ao vivo
+            self._close_source(source); source = None
+            with self.lock: self.current_item = None; self.current_offset_bytes = 0
+            self.checkpoint_state(force=True)
 
     def _master_broadcast_thread(self):
         live_timeout_counter = 0 # Contador para o "alarme inteligente"
@@ -202,10 +432,17 @@ class RadioStation:
             time.sleep(0.001)
 
     def start(self):
-        # ... (Este método permanece exatamente o mesmo da sua versão) ...
+        """Inicia as threads da rádio. Chamadas repetidas são ignoradas (duas threads de AutoDJ misturariam faixas)."""
+        with self.lock:
+            if self.started: return
+            self.started = True
         autodj_producer = Thread(target=self._auto_dj_thread, daemon=True); autodj_producer.start()
         master_broadcaster = Thread(target=self._master_broadcast_thread, daemon=True); master_broadcaster.start()
+        self.recorder.start()
+        self.hls.start()
         print("Threads de Auto DJ e Transmissão Mestra iniciadas.")
+        # Com o estado restaurado a rádio já toca das listas salvas; a varredura da biblioteca fica em segundo plano
+        if self.state_restored: Thread(target=self.reload_master_lists, daemon=True).start()
         
     def get_status(self):
         """MODIFICADO: Retorna todas as configurações para o template."""
@@ -219,6 +456,10 @@ class RadioStation:
                 "live_user": self.live_user, 
                 "live_password": self.live_password,
                 "admin_user": self.admin_user,
+                "resume_after_live": self.resume_after_live,
+                "recording_enabled": self.recording_enabled,
+                "recording_retention_hours": self.recording_retention_hours,
+                "hls_enabled": self.hls_enabled,
                 "is_playing": self.is_playing, 
                 "listeners": len(self.listeners), 
                 "current_item": current_item_obj, 
@@ -227,14 +468,15 @@ class RadioStation:
                 "playback_mode": self.playback_mode, 
                 "jingle_interval": self.jingle_interval, 
                 "ad_interval": self.ad_interval,
-                "current_cover_url": self.current_cover_url
+                "current_cover_url": self.current_cover_url,
+                "first_audio_ms": self.first_audio_ms
             }
             
     def set_radio_name(self, name):
         with self.lock: self.radio_name = name; self.save_settings()
     def start_playback(self):
         with self.lock:
-            if not self.is_playing: self.is_playing = True; print(">>> COMANDO: Transmissão iniciada.")
+            if not self.is_playing: self.is_playing = True; self.autodj_wakeup.set(); print(">>> COMANDO: Transmissão iniciada.")
     def stop_playback(self):
         with self.lock:
             if self.is_playing: self.is_playing = False; print(">>> COMANDO: Transmissão parada.")
@@ -248,37 +490,42 @@ class RadioStation:
             order_file_path = os.path.join(CONFIG_DIR, f"{file_type}_order.txt")
             with open(order_file_path, 'w', encoding='utf-8') as f:
                 for filename in ordered_filenames: f.write(f"{filename}\n")
-            self.reload_master_lists(list_type=file_type)
+        self.reload_master_lists(list_type=file_type)
     def reload_master_lists(self, list_type='all'):
         with self.lock:
             if list_type in ['all', 'songs']: available = self._scan_directory(MUSIC_DIR); self.master_song_list = self._load_order(os.path.join(CONFIG_DIR, 'songs_order.txt'), available)
             if list_type in ['all', 'jingles']: available = self._scan_directory(JINGLES_DIR); self.master_jingle_list = self._load_order(os.path.join(CONFIG_DIR, 'jingles_order.txt'), available)
             if list_type in ['all', 'ads']: available = self._scan_directory(ADS_DIR); self.master_ad_list = self._load_order(os.path.join(CONFIG_DIR, 'ads_order.txt'), available)
+            self.library_dirty = True
             print("Listas mestras recarregadas.")
+        self.checkpoint_state(force=True)
     def _scan_directory(self, path): return [f for f in os.listdir(path) if f.endswith('.mp3')]
     def _build_play_queue(self):
         temp_song_list = self.master_song_list.copy();
         if not temp_song_list: return
         if self.playback_mode == 'shuffle': random.shuffle(temp_song_list)
-        self.play_queue.extend(temp_song_list)
+        self.play_queue.extend(temp_song_list); self.library_dirty = True
     def set_playback_mode(self, mode):
         with self.lock:
             if mode in ['shuffle', 'sequential']: self.playback_mode = mode
+        self.checkpoint_state(force=True)
     def set_intervals(self, jingle_interval, ad_interval):
         with self.lock: self.jingle_interval = int(jingle_interval); self.ad_interval = int(ad_interval)
+        self.checkpoint_state(force=True)
     def _get_next_item(self):
         with self.lock:
             if self.jingle_interval > 0 and self.songs_since_jingle >= self.jingle_interval and self.master_jingle_list: self.songs_since_jingle = 0; self.last_jingle_index = (self.last_jingle_index + 1) % len(self.master_jingle_list); return ('jingle', self.master_jingle_list[self.last_jingle_index])
             if self.ad_interval > 0 and self.songs_since_ad >= self.ad_interval and self.master_ad_list: self.songs_since_ad = 0; self.last_ad_index = (self.last_ad_index + 1) % len(self.master_ad_list); return ('ad', self.master_ad_list[self.last_ad_index])
             if not self.play_queue: self._build_play_queue();
             if not self.play_queue: return (None, None)
-            self.songs_since_jingle += 1; self.songs_since_ad += 1
+            self.songs_since_jingle += 1; self.songs_since_ad += 1; self.queue_consumed += 1
             return ('song', self.play_queue.pop(0))
     def _peek_next_item(self):
         with self.lock:
             next_songs_since_jingle = self.songs_since_jingle + 1; next_songs_since_ad = self.songs_since_ad + 1
             if self.jingle_interval > 0 and next_songs_since_jingle > self.jingle_interval and self.master_jingle_list: next_index = (self.last_jingle_index + 1) % len(self.master_jingle_list); return {'type': 'jingle', 'filename': self.master_jingle_list[next_index]}
             if self.ad_interval > 0 and next_songs_since_ad > self.ad_interval and self.master_ad_list: next_index = (self.last_ad_index + 1) % len(self.master_ad_list); return {'type': 'ad', 'filename': self.master_ad_list[next_index]}
+            if self.resume_item: return {'type': self.resume_item['type'], 'filename': self.resume_item['filename']}
             if self.play_queue: return {'type': 'song', 'filename': self.play_queue[0]}
             if self.master_song_list: return {'type': 'song', 'filename': '(Próxima aleatória...)' if self.playback_mode == 'shuffle' else self.master_song_list[0]}
             return None
@@ -290,7 +537,12 @@ class RadioStation:
         with self.lock:
             if queue in self.listeners: self.listeners.remove(queue)
     def _broadcast_chunk(self, chunk):
+        if self.first_audio_ms is None and chunk is not SILENT_CHUNK:
+            self.first_audio_ms = round((time.perf_counter() - self.launch_time) * 1000)
+            print(f">>> Primeiro byte de áudio transmitido {self.first_audio_ms} ms após o início. <<<")
         with self.lock:
             for queue in self.listeners:
                 try: queue.put_nowait(chunk)
-                except Full: pass
\ No newline at end of file
+                except Full: pass
+        self.recorder.feed(chunk)
+        self.hls.feed(chunk)
\ No newline at end of file
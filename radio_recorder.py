@@ -0,0 +1,173 @@
+import os
+import time
+import json
+from bisect import bisect_right
+from threading import Thread, Lock
+from queue import Queue, Full, Empty
+
+# --- Constantes da Gravação ---
+RECORDINGS_DIR = 'recordings'
+SEGMENT_NAME_FORMAT = '%Y%m%d-%H%M%S'
+WRITE_BATCH_BYTES = 64 * 1024 # Junta os blocos e grava no disco em lotes
+WRITE_FLUSH_INTERVAL = 2 # Segundos máximos que um lote fica na memória
+
+class StreamRecorder:
+    """Grava o sinal que foi ao ar em segmentos (um por hora ou por programa ao vivo), com índice de faixas ao lado.
+
+    O broadcaster só enfileira os blocos (sem bloquear); a escrita em disco acontece na thread própria do gravador.
+    O bitrate do que vai ao ar muda (ao vivo, silêncio), então o índice guarda pares (horário, byte) a cada lote
+    gravado e o time-shift busca por eles, nunca por um bitrate fixo.
+    """
+    def __init__(self, directory=RECORDINGS_DIR, retention_hours=72, enabled=False):
+        self.directory = directory
+        self.retention_hours = retention_hours
+        self.enabled = enabled
+        self.queue = Queue(maxsize=2048) # ~8 minutos de áudio, para aguentar travamentos do disco
+        self.dropped_chunks = 0
+        self.lock = Lock()
+        os.makedirs(self.directory, exist_ok=True)
+        # Lista em memória (início em epoch, caminho), lida do disco uma única vez; a thread de escrita a mantém
+        self.segments = self._scan_segments()
+        self.active_segment = None # Caminho do segmento sendo gravado
+        self.active_sync_points = [] # Pares (horário, byte) do segmento ativo
+
+    def start(self):
+        writer = Thread(target=self._writer_thread, daemon=True); writer.start()
+
+    def set_enabled(self, enabled):
+        self.enabled = bool(enabled)
+        if not self.enabled: self._enqueue(('close', None, None))
+
+    def feed(self, chunk):
+        """Chamado pelo broadcaster para cada bloco transmitido. Nunca bloqueia: se o disco atrasar, descarta."""
+        if self.enabled and not self._enqueue(('audio', chunk, time.time())): self.dropped_chunks += 1
+
+    def mark(self, title, new_segment=None):
+        """Registra uma troca de faixa no índice. 'new_segment' ('live' ou '') força um novo arquivo, ex.: início/fim do ao vivo."""
+        if self.enabled: self._enqueue(('mark', title, (new_segment, time.time())))
+
+    def _enqueue(self, item):
+        try: self.queue.put_nowait(item); return True
+        except Full: return False
+
+    # --- Thread de escrita ---
+    def _writer_thread(self):
+        segment, buffer, last_flush = None, bytearray(), time.monotonic()
+        title = None # Título atual, atualizado só pelos eventos 'mark' da fila (na ordem em que foram ao ar)
+        buffer_started_at = None # Horário em que o primeiro bloco do lote atual foi transmitido
+        while True:
+            try: kind, payload, extra = self.queue.get(timeout=WRITE_FLUSH_INTERVAL)
+            except Empty: kind = None
+            try:
+                if kind == 'audio':
+                    if segment is None or (not segment['tag'] and time.strftime('%Y%m%d%H', time.localtime(extra)) != segment['hour']):
+                        segment = self._rotate(segment, buffer, buffer_started_at, title, started_at=extra)
+                    if not buffer: buffer_started_at = extra
+                    buffer += payload
+                elif kind == 'mark':
+                    new_segment, marked_at = extra
+                    title = payload
+                    if new_segment is not None: segment = self._rotate(segment, buffer, buffer_started_at, title, tag=new_segment, started_at=marked_at)
+                    elif segment: self._write_index(segment, {'time': marked_at, 'bytes': segment['bytes'] + len(buffer), 'title': title})
+                elif kind == 'close' and segment:
+                    self._close(segment, buffer, buffer_started_at); segment = None
+                if segment and buffer and (len(buffer) >= WRITE_BATCH_BYTES or time.monotonic() - last_flush >= WRITE_FLUSH_INTERVAL):
+                    self._flush(segment, buffer, buffer_started_at); last_flush = time.monotonic()
+            except OSError as e:
+                print(f"Erro na gravação do stream: {e}")
+                buffer.clear(); segment = None
+                with self.lock: self.active_segment = None
+
+    def _rotate(self, segment, buffer, buffer_started_at, title, tag='', started_at=None):
+        if segment: self._close(segment, buffer, buffer_started_at)
+        started_at = started_at or time.time()
+        name = time.strftime(SEGMENT_NAME_FORMAT, time.localtime(started_at)) + (f"-{tag}" if tag else '')
+        path = os.path.join(self.directory, f"{name}.mp3")
+        segment = {'path': path, 'file': open(path, 'ab'), 'index': open(f"{path}.jsonl", 'a', encoding='utf-8'),
+                   'tag': tag, 'hour': time.strftime('%Y%m%d%H', time.localtime(started_at)), 'started_at': started_at}
+        segment['bytes'] = segment['file'].tell() # Dois segmentos no mesmo segundo caem no mesmo arquivo
+        with self.lock:
+            if not self.segments or self.segments[-1][1] != path: self.segments.append((started_at, path))
+            self.active_segment, self.active_sync_points = path, []
+        if title: self._write_index(segment, {'time': started_at, 'bytes': segment['bytes'], 'title': title})
+        self._apply_retention()
+        return segment
+
+    def _flush(self, segment, buffer, buffer_started_at):
+        if not buffer: return
+        sync_point = (buffer_started_at, segment['bytes'])
+        segment['file'].write(buffer); segment['file'].flush()
+        segment['bytes'] += len(buffer); buffer.clear()
+        self._write_index(segment, {'time': sync_point[0], 'bytes': sync_point[1]})
+        with self.lock: self.active_sync_points.append(sync_point)
+
+    def _write_index(self, segment, entry):
+        """Linhas do índice: com 'title' é troca de faixa; sem, é um ponto de sincronia (horário, byte) do lote gravado."""
+        segment['index'].write(json.dumps(entry, ensure_ascii=False) + '\n'); segment['index'].flush()
+
+    def _close(self, segment, buffer, buffer_started_at):
+        self._flush(segment, buffer, buffer_started_at)
+        segment['file'].close(); segment['index'].close()
+        with self.lock:
+            if self.active_segment == segment['path']: self.active_segment, self.active_sync_points = None, []
+
+    def _apply_retention(self):
+        if self.retention_hours <= 0: return
+        limit = time.time() - self.retention_hours * 3600
+        with self.lock:
+            expired = [s for s in self.segments if s[0] < limit and s[1] != self.active_segment]
+            self.segments = [s for s in self.segments if s not in expired]
+        for _, path in expired:
+            for p in (path, f"{path}.jsonl"):
+                try: os.remove(p)
+                except FileNotFoundError: pass
+            print(f"[Gravação] Segmento removido pela política de retenção: {path}")
+
+    def _scan_segments(self):
+        segments = []
+        for filename in os.listdir(self.directory):
+            if not filename.endswith('.mp3'): continue
+            try: started_at = time.mktime(time.strptime(filename[:15], SEGMENT_NAME_FORMAT))
+            except ValueError: continue
+            segments.append((started_at, os.path.join(self.directory, filename)))
+        return sorted(segments)
+
+    # --- Consulta (usada pelo time-shift) ---
+    def _sync_points(self, path):
+        with self.lock:
+            if path == self.active_segment: return list(self.active_sync_points)
+        points = []
+        try:
+            with open(f"{path}.jsonl", 'r', encoding='utf-8') as f:
+                for line in f:
+                    try: entry = json.loads(line)
+                    except ValueError: continue
+                    if 'title' not in entry and 'time' in entry and 'bytes' in entry: points.append((entry['time'], entry['bytes']))
+        except FileNotFoundError: pass
+        return points
+
+    def find_position(self, start_ts):
+        """Retorna (caminho, offset em bytes) do ponto gravado mais próximo de 'start_ts', ou None. Pode ler o índice do disco."""
+        with self.lock: segments = list(self.segments)
+        if not segments: return None
+        candidates = [s for s in segments if s[0] <= start_ts] or segments[:1]
+        path = candidates[-1][1]
+        points = self._sync_points(path)
+        index = bisect_right([t for t, _ in points], start_ts) - 1
+        if index < 0: offset = 0
+        elif index + 1 < len(points):
+            # Interpola entre dois lotes gravados: dentro de um lote o bitrate é praticamente constante
+            (t0, b0), (t1, b1) = points[index], points[index + 1]
+            offset = b0 + int((b1 - b0) * (start_ts - t0) / (t1 - t0)) if t1 > t0 else b0
+        else: offset = points[index][1]
+        return path, offset
+
+    def next_segment(self, path):
+        """Segmento gravado depois de 'path', ou None se 'path' ainda é o mais recente. Só consulta a memória."""
+        with self.lock:
+            paths = [p for _, p in self.segments]
+            if path in paths and paths.index(path) + 1 < len(paths): return paths[paths.index(path) + 1]
+        return None
+
+    def is_active(self, path):
+        with self.lock: return self.active_segment == path